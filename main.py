@@ -18,10 +18,14 @@ def parse_arguments():
     
     parser = argparse.ArgumentParser(description='Oil Spill Simulation and Visualization')
     parser.add_argument('-c', '--config', type=str, default='configs/input.toml', help='Path to the configuration file (default: configs/input.toml)')
-    parser.add_argument("--store-solution", action="store_true", help="Store the solution as a text file")
+    parser.add_argument("--store-solution", action="store_true", help="Store the solution as a binary .npz file")
+    parser.add_argument("--json", action="store_true", help="Store the solution as a JSON text file instead of .npz")
     parser.add_argument("--plot", action="store_true", help="Plot the final oil distribution")
     parser.add_argument('--video', action='store_true', help='Create an oil distribution video')
+    parser.add_argument('--video-workers', type=int, default=1, help='Number of processes rendering the video frames (default: 1)')
     parser.add_argument("--log-summary", action="store_true", help="Log simulation summary")
+    parser.add_argument('--no-mesh-cache', action='store_true', help='Do not read or write the mesh cache file next to the mesh file')
+    parser.add_argument('--threads', type=int, help='Number of threads running the simulation (default: one per CPU core)')
     parser.add_argument('--startTime', type=int, help='Time to start the simulation from the restart file')
     args = parser.parse_args()
     
@@ -94,23 +98,28 @@ if __name__ == "__main__":
     if restartFile and os.path.isfile(restartFile):
         oil_distribution_history = load_solution(restartFile, args.startTime)
     else:
-        oil_distribution_history = []
+        oil_distribution_history = None
         
     # Step 6: Initialize mesh
-    mesh = Mesh(mesh_path)
+    mesh = Mesh(mesh_path, use_cache=not args.no_mesh_cache)
     
     # Step 7: Initialize simulation
-    sim = Simulation(mesh, tStart, tEnd, num_steps)
-    if oil_distribution_history:
+    try:
+        sim = Simulation(mesh, tStart, tEnd, num_steps, num_threads=args.threads)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    if oil_distribution_history is not None:
         sim.oil_distribution_history = oil_distribution_history
     else:
         sim.solution()
 
     
-    # Step 8: Store the solution as a text file
+    # Step 8: Store the solution as a binary or text file
     if args.store_solution:
         if write_frequency: 
-            store_solution(sim.oil_distribution_history, os.path.join(results_dir, 'solution.json'))
+            solution_name = 'solution.json' if args.json else 'solution.npz'
+            store_solution(sim.oil_distribution_history, os.path.join(results_dir, solution_name), use_json=args.json)
     
     # Step 9: Plot the final oil distribution
     if args.plot:
@@ -122,9 +131,9 @@ if __name__ == "__main__":
     # Step 10: Create video if writeFrequency is given:
     if args.video:
         video(mesh, sim.oil_distribution_history, 
-                               os.path.join(results_dir, 'simulation_video.mp4'), write_frequency)
+                               os.path.join(results_dir, 'simulation_video.mp4'), write_frequency, workers=args.video_workers)
                 
     # Step 8: Log simulation summary 
     if args.log_summary:
-        log_summary(config_file, sim.oil_distribution_history)
+        log_summary(config, mesh, sim.oil_distribution_history)
         
@@ -2,6 +2,47 @@ import math
 import numpy as np
 from abc import ABC, abstractmethod
 
+# Center of the initial oil spill:
+OIL_POINT = np.array([0.35, 0.45])
+
+# Type codes of the cells in the mesh arrays:
+LINE = 0
+TRIANGLE = 1
+
+
+def velocity_field(midpoints):
+    """
+    Compute the velocity field at one or several midpoints.
+
+    Parameters:
+    - midpoints (np.array): A single midpoint of shape (2,) or an array of
+      midpoints of shape (N, 2).
+
+    Returns:
+    - np.array: The velocities, with the same shape as the midpoints.
+    """
+    midpoints = np.asarray(midpoints)
+    # Velocity in x-direction: y - 0.2x, velocity in y-direction: -x
+    return np.stack([midpoints[..., 1] - 0.2 * midpoints[..., 0], -midpoints[..., 0]], axis=-1)
+
+
+def initial_oil(midpoints, oil_point=OIL_POINT):
+    """
+    Compute the initial amount of oil at one or several midpoints.
+
+    Parameters:
+    - midpoints (np.array): A single midpoint of shape (2,) or an array of
+      midpoints of shape (N, 2).
+    - oil_point (np.array): The center of the oil spill.
+
+    Returns:
+    - float or np.array: The amount of oil at each midpoint.
+    """
+    # Squared distances to the oil point in one pass, without a temporary array of squares:
+    offsets = np.asarray(midpoints) - oil_point
+    squared_distance = np.einsum('...i,...i->...', offsets, offsets)
+    return np.exp(- squared_distance / 0.01)
+
 
 class CellFactory:
     """Create cell instances based on a cell type.
@@ -23,31 +64,35 @@ class CellFactory:
 
     # Make the instance of the CellFactory callable: looks up the coresponding
     # cell type in the cellTypes dictionary and create a new cell object
-    def __call__(self, key, pts, idx, coord):
+    def __call__(self, key, pts, idx, coord, mesh=None):
         """Create a new cell object based on the registered cell type.
 
         Parameters:
         - pts : The points' indices.
         - idx : The index of the cell.
         - coord : The coordinates of the points in the cell.
+        - mesh : The mesh holding precomputed cell arrays (optional).
 
         Returns:
         - An instance of the cell type.
         """
-        return self._cellTypes[key](pts, idx, coord)
+        return self._cellTypes[key](pts, idx, coord, mesh)
 
 
 class Cell(ABC):
-    def __init__(self, pts, idx, coord) -> None:
+    def __init__(self, pts, idx, coord, mesh=None) -> None:
         """
         Abstract cell class.
 
         Initialize a cell with given points, index of a cell, and coordinates of each point. 
+        If a mesh is given, the compute methods return the values the mesh computed
+        for all cells at once instead of computing them for this cell.
 
         Parameters: 
         - pts (list[int])     : point ids of cell
         - idx (int)           : index of cell
         coord (list[array]) : coordinates of points
+        - mesh (Mesh)         : mesh holding the precomputed cell arrays (optional)
 
         Returns: 
         - None
@@ -57,8 +102,10 @@ class Cell(ABC):
         self._coord = coord
 
         # Variables
-        self._oil_point = np.array([0.35, 0.45])
+        self._oil_point = OIL_POINT
         self._neighbors_indices = []
+        self._shared_edges = {}   # Neighbor index -> point IDs of the shared edge
+        self._mesh = mesh
         self._midpoint = self.computeMidpoint()
         self._velocity = self.computeVelocity()
         self._oil = self.computeOil()
@@ -73,12 +120,29 @@ class Cell(ABC):
         Returns: 
         - list[int]: List of indexes of neighboring cells of the current cell. 
         """
-        for cell in all_cells:
-            if cell._idx != self._idx:
-                if isinstance(cell, Triangle) or isinstance(cell, Line):
-                    common_points = set(cell._pointIDs) & set(self._pointIDs)
-                    if len(common_points) == 2:
-                        self._neighbors_indices.append(cell._idx)
+        # Compare the point IDs of all other cells (padded with -1) with the point
+        # IDs of this cell at once, instead of intersecting sets for every cell:
+        if self._mesh is not None:
+            # The type codes and padded point IDs are already stored in the mesh:
+            indices = np.array([cell._idx for cell in all_cells], dtype=int)
+            codes = self._mesh._cell_type_codes[indices]
+            others = indices[(indices != self._idx) & ((codes == TRIANGLE) | (codes == LINE))]
+            other_pts = self._mesh._cell_points[others]
+        else:
+            cells = [cell for cell in all_cells
+                     if cell._idx != self._idx and (isinstance(cell, Triangle) or isinstance(cell, Line))]
+            others = np.array([cell._idx for cell in cells], dtype=int)
+            other_pts = np.full((len(cells), 3), -1)
+            for row, cell in enumerate(cells):
+                other_pts[row, :len(cell._pointIDs)] = cell._pointIDs
+        if len(others) == 0:
+            return self._neighbors_indices
+        in_cell = (other_pts[:, :, None] == np.asarray(self._pointIDs)[None, None, :]).any(axis=2)
+
+        for row in np.flatnonzero(in_cell.sum(axis=1) == 2):
+            neighbor = int(others[row])
+            self._neighbors_indices.append(neighbor)
+            self._shared_edges[neighbor] = tuple(sorted(other_pts[row][in_cell[row]].tolist()))
         return self._neighbors_indices
 
     @abstractmethod
@@ -98,12 +162,9 @@ class Cell(ABC):
         Returns: 
         - np.array: The velocity of the cell.  
         """
-        midpoint = np.array(self._midpoint)
-        # Velocity at midpoint in x-direction:
-        v_x = midpoint[1] - 0.2 * midpoint[0]
-        # Velocity at midpoint in y-direction:
-        v_y = -midpoint[0]
-        return np.array([v_x, v_y])
+        if self._mesh is not None:
+            return self._mesh._velocities[self._idx]
+        return velocity_field(self._midpoint)
 
     def computeOil(self):
         """ 
@@ -112,9 +173,12 @@ class Cell(ABC):
         Returns: 
         - float: The computed amount of oil. 
         """
-        squared_distance = np.sum(np.square(self._midpoint - self._oil_point))
-        u = math.exp(- squared_distance / 0.01)
-        return u
+        if self._mesh is not None:
+            return self._mesh._oil[self._idx]
+        # Scalar arithmetic for a single midpoint, without temporary arrays:
+        dx = float(self._midpoint[0] - self._oil_point[0])
+        dy = float(self._midpoint[1] - self._oil_point[1])
+        return math.exp(- (dx * dx + dy * dy) / 0.01)
 
 
 class Triangle(Cell):
@@ -122,7 +186,7 @@ class Triangle(Cell):
     
     The Triangle class is a child class of the Cell class. 
     """
-    def __init__(self, pts, idx, coord) -> None:
+    def __init__(self, pts, idx, coord, mesh=None) -> None:
         """ 
         Initialize a Triangle cell. 
 
@@ -130,11 +194,12 @@ class Triangle(Cell):
         - pts (list[int]): Point IDs of the cell. 
         - idx (int): Index of the  cell. 
         - coord (list[array]): Coordinates of the vertexes in the triangle. 
+        - mesh (Mesh): Mesh holding the precomputed cell arrays (optional). 
 
         Returns:
         - None 
         """
-        super().__init__(pts, idx, coord)
+        super().__init__(pts, idx, coord, mesh)
         self._neighbors_indices = []
         self._area = self.computeArea()
         
@@ -157,9 +222,11 @@ class Triangle(Cell):
         Raises: 
         - ValueError: If the number of coordinates are not three. 
         """
+        if self._mesh is not None:
+            return self._mesh._midpoints[self._idx]
         if len(self._coord) != 3:
             raise ValueError("Triangle cells must have exactly 3 coordinates.")
-        coords = np.array(self._coord)[:, :2]
+        coords = np.asarray(self._coord)[:, :2]
         midpoint = np.mean(coords, axis=0)
         return midpoint
     
@@ -170,10 +237,13 @@ class Triangle(Cell):
         Returns: 
         - float: The area of the triangle. 
         """
+        if self._mesh is not None:
+            return self._mesh._areas[self._idx]
         p1 = self._coord[0]
         p2 = self._coord[1]
         p3 = self._coord[2]
-        A = 0.5 * abs((p1[0] * (p2[1] - p3[1]) + p2[0] * (p3[1] - p1[1]) + p3[0] * (p1[1] - p2[1])))
+        # Half the 2D determinant of the edge vectors from p1, as in Mesh._buildGeometry:
+        A = 0.5 * abs((p2[0] - p1[0]) * (p3[1] - p1[1]) - (p2[1] - p1[1]) * (p3[0] - p1[0]))
         return A
 
 
@@ -184,7 +254,7 @@ class Line(Cell):
 
     The Triangle class is a child class of the Cell class.
     """ 
-    def __init__(self, pts, idx, coord) -> None:
+    def __init__(self, pts, idx, coord, mesh=None) -> None:
         """ 
         Initialize a Line cell.
 
@@ -192,11 +262,12 @@ class Line(Cell):
         - pts (list[int]): Point IDs of the cell. 
         - idx (int): Index of the  cell. 
         - coord (list[array]): Coordinates of the vertexes in the triangle. 
+        - mesh (Mesh): Mesh holding the precomputed cell arrays (optional). 
 
         Returns:
         - None 
         """
-        super().__init__(pts, idx, coord)
+        super().__init__(pts, idx, coord, mesh)
         self._neighbors_indices = []
         
     def __str__(self):
@@ -218,8 +289,10 @@ class Line(Cell):
         Raises: 
         - ValueError: If the number of coordinates are not two. 
         """
+        if self._mesh is not None:
+            return self._mesh._midpoints[self._idx]
         if len(self._coord) != 2:
             raise ValueError("Line cells must have exactly 2 coordinates.")
-        coords = np.array(self._coord)[:, :2]
+        coords = np.asarray(self._coord)[:, :2]
         midpoint = np.mean(coords, axis=0)
         return midpoint
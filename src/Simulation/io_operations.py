@@ -1,5 +1,6 @@
 import toml
 import json
+import numpy as np
 
 def read_config_file(filename):
     """
@@ -40,17 +41,52 @@ def read_config_file(filename):
     
     
     
-def store_solution(oil_distribution_history, filename):
+def history_to_dicts(oil_distribution_history):
+    """
+    Convert the oil distribution history to a list of dictionaries for JSON output.
+
+    Parameters:
+    oil_distribution_history (np.array): Oil distribution at each time step, one row per step.
+
+    Returns:
+    list: List of dictionaries mapping cell indices to oil amount at each time step.
+    """
+    return [dict(enumerate(step)) for step in np.asarray(oil_distribution_history).tolist()]
+
+
+def dicts_to_history(oil_distribution_dicts):
+    """
+    Convert a list of dictionaries read from JSON back to the oil distribution history.
+
+    Parameters:
+    oil_distribution_dicts (list): List of dictionaries mapping cell indices to oil amount.
+
+    Returns:
+    np.array: Oil distribution at each time step, one row per step.
+    """
+    return np.array([[step[key] for key in sorted(step, key=int)] for step in oil_distribution_dicts])
+    
+    
+def store_solution(oil_distribution_history, filename, use_json=False):
     """
     Stores the oil distribution history to a file.
 
+    By default the history is stored as a compressed binary NumPy file (.npz) holding
+    the arrays 'oil' (one row per time step) and 'cell_idx' (the cell index of each column).
+
     Parameters:
-    oil_distribution_history (list): List of dictionaries or arrays representing oil distribution at each time step.
+    oil_distribution_history (np.array): Oil distribution at each time step, one row per step.
     filename (str): Path to the file to store the solution.
+    use_json (bool): Store the history as a JSON list of dictionaries instead.
     """
     try:
-        with open(filename, 'w') as file:
-            json.dump(oil_distribution_history, file, indent=4)
+        if use_json:
+            with open(filename, 'w') as file:
+                json.dump(history_to_dicts(oil_distribution_history), file, indent=4)
+        else:
+            oil_distribution_history = np.asarray(oil_distribution_history)
+            np.savez_compressed(filename, oil=oil_distribution_history,
+                                cell_idx=np.arange(oil_distribution_history.shape[1]))
         print(f"Saved solution to {filename}.")
         
     except Exception as e:
@@ -62,20 +98,27 @@ def load_solution(filename, start_time = None):
     """
     Loads the oil distribution history from a file.
 
+    Files ending in .json are read as JSON, any other file as a NumPy .npz file
+    written by store_solution.
+
     Parameters:
     filename (str): Path to the file containing the solution.
     t_restart (int or None): Restart time step. If provided, starts simulation from this time step.
 
     Returns:
-    list: List of dictionaries or arrays representing oil distribution at each time step.
+    np.array: Oil distribution at each time step, one row per step.
     """
     try:
-        with open(filename, 'r') as file:
-            oil_distribution_history = json.load(file)
+        if filename.endswith('.json'):
+            with open(filename, 'r') as file:
+                oil_distribution_history = dicts_to_history(json.load(file))
+        else:
+            with np.load(filename) as solution:
+                oil_distribution_history = solution['oil']
             
         # If start_time is provided, find the closest time step in the history:
         if start_time is not None:
-            closest_time_step = min(oil_distribution_history.keys(), key=lambda x: abs(x - start_time))
+            closest_time_step = min(range(len(oil_distribution_history)), key=lambda x: abs(x - start_time))
             print (f"Restart the simulation from time step {closest_time_step}.")
             
         return oil_distribution_history
@@ -89,4 +132,3 @@ def load_solution(filename, start_time = None):
     except Exception as e:
         print(f"Error loading solution from {filename}: {e}")
         return None
-            
\ No newline at end of file
@@ -0,0 +1,125 @@
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True, parallel=True, fastmath=True)
+def step_loop(oil0, indptr, neighbors, vdotn, area_inv, dt, num_steps, out, threshold):
+    """ 
+    Run all time steps of the upwind scheme in compiled code. 
+
+    The edges of the cell with index i are stored at positions indptr[i] to
+    indptr[i + 1] of neighbors and vdotn, so every cell sums the fluxes over its own
+    edges and the cells can be updated in parallel without write conflicts. 
+
+    Only the active cells are updated: a cell is active if the amount of oil in the
+    cell or in one of its neighbors is larger than threshold (in absolute value).
+    The fluxes of all other cells are negligible, so their oil is kept. When the oil
+    of a cell exceeds the threshold, its neighbors become active for the next step. 
+
+    Parameters: 
+    - oil0 (np.array): The oil in each cell at the start time. 
+    - indptr (np.array): Start of the edges of each cell, of length N + 1. 
+    - neighbors (np.array): Index of the neighboring cell of each edge. 
+    - vdotn (np.array): Dot product of the average velocity and the scaled normal of each edge. 
+    - area_inv (np.array): Inverse area of each cell (zero for cells that are not updated). 
+    - dt (float): The time step. 
+    - num_steps (int): The number of time steps. 
+    - out (np.array): Array of shape (num_steps + 1, N) receiving the oil at every time step. 
+    - threshold (float): Amount of oil below which a cell does not contribute to the fluxes. 
+
+    Returns: 
+    - np.array: The filled out array. 
+    """
+    num_cells = oil0.shape[0]
+    out[0] = oil0
+
+    # Cells with oil above the threshold, and cells that are or touch such a cell:
+    hot = np.abs(oil0) > threshold
+    active = hot.copy()
+    for i in prange(num_cells):
+        for k in range(indptr[i], indptr[i + 1]):
+            if hot[neighbors[k]]:
+                active[i] = True
+
+    for step in range(num_steps):
+        old = out[step]
+        new = out[step + 1]
+        for i in prange(num_cells):
+            if not active[i]:
+                new[i] = old[i]
+                continue
+            total_flux = 0.0
+            for k in range(indptr[i], indptr[i + 1]):
+                # Upwind: outflow uses the cell's oil, inflow the neighbor's oil
+                if vdotn[k] > 0:
+                    total_flux += old[i] * vdotn[k]
+                else:
+                    total_flux += old[neighbors[k]] * vdotn[k]
+            new[i] = old[i] - dt * area_inv[i] * total_flux
+
+        # Activate the neighbors of the cells whose oil exceeded the threshold:
+        for i in prange(num_cells):
+            if active[i] and not hot[i] and abs(new[i]) > threshold:
+                hot[i] = True
+                for k in range(indptr[i], indptr[i + 1]):
+                    active[neighbors[k]] = True
+    return out
+
+
+@njit(cache=True, parallel=True, fastmath=True)
+def step_loop_triangles(oil0, neighbors, vdotn, area_inv, dt, num_steps, out, threshold):
+    """ 
+    Run all time steps of the upwind scheme for cells with at most three edges. 
+
+    Same scheme as step_loop, but the edges are stored in tables of shape (N, 3): the
+    edges of the cell with index i are neighbors[i] and vdotn[i]. Unused slots hold the
+    cell itself with a zero dot product. The fixed number of edges lets the compiler
+    unroll the loop over the edges and removes the row offsets of step_loop. 
+
+    Parameters: 
+    - oil0 (np.array): The oil in each cell at the start time. 
+    - neighbors (np.array): Index of the neighboring cell of each edge, of shape (N, 3). 
+    - vdotn (np.array): Dot product of the average velocity and the scaled normal of each edge, of shape (N, 3). 
+    - area_inv (np.array): Inverse area of each cell (zero for cells that are not updated). 
+    - dt (float): The time step. 
+    - num_steps (int): The number of time steps. 
+    - out (np.array): Array of shape (num_steps + 1, N) receiving the oil at every time step. 
+    - threshold (float): Amount of oil below which a cell does not contribute to the fluxes. 
+
+    Returns: 
+    - np.array: The filled out array. 
+    """
+    num_cells = oil0.shape[0]
+    out[0] = oil0
+
+    # Cells with oil above the threshold, and cells that are or touch such a cell:
+    hot = np.abs(oil0) > threshold
+    active = hot.copy()
+    for i in prange(num_cells):
+        for k in range(3):
+            if hot[neighbors[i, k]]:
+                active[i] = True
+
+    for step in range(num_steps):
+        old = out[step]
+        new = out[step + 1]
+        for i in prange(num_cells):
+            if not active[i]:
+                new[i] = old[i]
+                continue
+            total_flux = 0.0
+            for k in range(3):
+                # Upwind: outflow uses the cell's oil, inflow the neighbor's oil
+                if vdotn[i, k] > 0:
+                    total_flux += old[i] * vdotn[i, k]
+                else:
+                    total_flux += old[neighbors[i, k]] * vdotn[i, k]
+            new[i] = old[i] - dt * area_inv[i] * total_flux
+
+        # Activate the neighbors of the cells whose oil exceeded the threshold:
+        for i in prange(num_cells):
+            if active[i] and not hot[i] and abs(new[i]) > threshold:
+                hot[i] = True
+                for k in range(3):
+                    active[neighbors[i, k]] = True
+    return out
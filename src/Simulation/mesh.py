@@ -1,58 +1,452 @@
 import meshio
-from .cells import CellFactory, Line, Triangle
+import hashlib
+import os
+import numpy as np
+from itertools import permutations
+from scipy.spatial import cKDTree
+from .cells import CellFactory, Line, Triangle, LINE, TRIANGLE, velocity_field, initial_oil
+
+# Type code of each mesh cell type, the cell type of each code and the number of points of each cell type:
+CELL_TYPE_CODES = {"line": LINE, "triangle": TRIANGLE}
+CELL_TYPE_NAMES = {code: cellType for cellType, code in CELL_TYPE_CODES.items()}
+CELL_NUM_POINTS = {"line": 2, "triangle": 3}
 
 
 class Mesh:
     """ 
     Manages a mesh structure by creating instances of different cell types
     """
-    def __init__(self, mshName) -> None:
+    # Default floating point type of the point coordinates, the cell arrays and the
+    # simulation. The first order upwind scheme is far less accurate than single
+    # precision, so float32 halves the memory traffic at no cost.
+    DTYPE = np.float32
+
+    def __init__(self, mshName, use_cache=False, dtype=None) -> None:
         """ 
         Initialize the Mesh by reading the mesh file and setting up cell instances. 
 
         Parameters: 
         - mshName(str): The mesh file to be read. 
+        - use_cache(bool): Store the parsed points and cells in the cache file mshName + '.cache.npz'
+          and read them from there instead of the mesh file while the mesh file is unchanged. 
+        - dtype(np.dtype): The floating point type of the point coordinates and the cell arrays.
+          Default: Mesh.DTYPE. Use np.float64 for double precision. 
 
         Returns: 
         - None 
         """
-        # Read in the mesh file:
-        msh = meshio.read(mshName)
+        self._dtype = np.dtype(self.DTYPE if dtype is None else dtype)
+
+        # Read the parsed mesh arrays from the cache file if it matches the mesh file:
+        content_hash = self._meshHash(mshName) if use_cache else None
+        cached = self._loadCache(mshName, content_hash) if use_cache else None
+        if cached is not None:
+            self._points, self._cell_type_codes, self._cell_points = cached
+        else:
+            # Read in the mesh file:
+            msh = meshio.read(mshName)
+
+            # Extract the points and cells from the mesh:
+            cells = msh.cells
+            self._points = msh.points   # List of points' coordinates
+
+            # Keep the cell blocks of the known cell types, and store the type
+            # code and the point IDs (padded with -1) of every cell in arrays:
+            blocks = [(CELL_TYPE_CODES[cellForType.type], cellForType.data) for cellForType in cells
+                      if cellForType.type in CELL_TYPE_CODES]
+            num_cells = sum(len(cellPoints) for _, cellPoints in blocks)
+            self._cell_type_codes = np.empty(num_cells, dtype=np.int8)
+            self._cell_points = np.full((num_cells, 3), -1, dtype=np.int32)
+            start = 0
+            for code, cellPoints in blocks:
+                end = start + len(cellPoints)
+                self._cell_type_codes[start:end] = code
+                self._cell_points[start:end, :cellPoints.shape[1]] = cellPoints
+                start = end
+
+            if use_cache:
+                self._storeCache(mshName, content_hash)
+
+        # The geometry and the initial conditions are always computed from the
+        # parsed points, so they follow changes of the velocity field and initial oil:
+        self._buildGeometry()
+        # The spatial queries compare the points with the query bounds at the
+        # precision of the mesh file, so rounding to dtype cannot move points
+        # across a boundary:
+        self._query_points = self._points[:, :2].astype(np.float64)
+        self._points = self._points.astype(self._dtype)
+        self._num_cells = len(self._cell_type_codes)
+
+        # Indices and point IDs of the cells of each type, and the vertex
+        # coordinates of the triangles used for plotting:
+        self._line_indices = np.flatnonzero(self._cell_type_codes == LINE)
+        self._line_points = self._cell_points[self._line_indices, :2]
+        self._triangle_indices = np.flatnonzero(self._cell_type_codes == TRIANGLE)
+        self._triangle_points = self._cell_points[self._triangle_indices]
+        self._triangle_vertex_coords = self._points[self._triangle_points][:, :, :2]
 
-        # Extract the points and cells from the mesh:
-        cells = msh.cells
-        self._points = msh.points   # List of points' coordinates
+        # Cell instances, created the first time they are needed, and the
+        # neighbor graph, built by computeallneighbors:
+        self._cells = None
+        self._nbr_indptr = None
 
-        # Initialize the list to store all cells instances:
-        self._cells_instances = []
+        # Spatial search trees, built the first time they are needed:
+        self._point_tree = None
+        self._midpoint_tree = None
 
+    @property
+    def _cells_instances(self):
+        """
+        The list of all cell instances, created on first access.
+
+        The cell with index i is at position i (cell._idx == i), like in all cell
+        arrays of the mesh, so cells are looked up by index instead of searched for.
+
+        Returns:
+        - list[Cell]: The cell instances.
+        """
+        if self._cells is None:
+            self._createCells()
+        return self._cells
+
+    def _createCells(self):
+        """
+        Create the cell instances from the type codes and point IDs of the cells.
+
+        The instances are views of the mesh arrays: their midpoint, velocity, oil and
+        area are looked up in the arrays instead of being computed again.
+
+        Returns:
+        - None
+        """
         # Initialize the CellFactory and register cell types:
         cf = CellFactory()
         cf.register("line", Line)
         cf.register("triangle", Triangle)
 
-        idx = 0
-        for cellForType in cells:
-            cellType = cellForType.type
-            if cellType not in cf._cellTypes:
-                continue
-            cellPoints = cellForType.data
-            # Iterate over each set of points to create cell instances:
-            for pts in cellPoints:
-                # Extract coordinates of points using their indices:
-                coord = [self._points[index] for index in pts]
-                # Create a cell instance using the factory and append it to
-                # the cell instance list:
-                self._cells_instances.append(cf(cellType, pts, idx, coord))
-                idx += 1
+        self._cells = []
+        for idx, (code, pts) in enumerate(zip(self._cell_type_codes, self._cell_points)):
+            cellType = CELL_TYPE_NAMES[code]
+            pts = pts[:CELL_NUM_POINTS[cellType]]
+            # Create a cell instance using the factory and append it to
+            # the cell instance list:
+            self._cells.append(cf(cellType, pts, idx, self._points[pts], self))
+        if self._nbr_indptr is not None:
+            self._setCellNeighbors()
+
+    def _buildGeometry(self):
+        """
+        Compute the midpoints, velocities, initial oil and areas of all cells at once.
+
+        The results are stored in arrays of type self._dtype indexed by the cell index:
+        self._midpoints and self._velocities of shape (N, 2), self._oil and self._areas
+        of shape (N,). Lines have no area, so their area is zero.
+
+        Returns:
+        - None
+        """
+        num_cells = len(self._cell_type_codes)
+        self._midpoints = np.zeros((num_cells, 2), dtype=self._dtype)
+        self._areas = np.zeros(num_cells, dtype=self._dtype)
+
+        lines = np.flatnonzero(self._cell_type_codes == LINE)
+        self._midpoints[lines] = self._points[self._cell_points[lines, :2]][:, :, :2].mean(axis=1)
+
+        triangles = np.flatnonzero(self._cell_type_codes == TRIANGLE)
+        coords = self._points[self._cell_points[triangles]][:, :, :2]
+        self._midpoints[triangles] = coords.mean(axis=1)
+        p0, p1, p2 = coords[:, 0], coords[:, 1], coords[:, 2]
+        self._areas[triangles] = 0.5 * np.abs((p1[:, 0] - p0[:, 0]) * (p2[:, 1] - p0[:, 1]) -
+                                              (p1[:, 1] - p0[:, 1]) * (p2[:, 0] - p0[:, 0]))
+
+        self._velocities = velocity_field(self._midpoints).astype(self._dtype)
+        self._oil = initial_oil(self._midpoints).astype(self._dtype)
 
     def computeallneighbors(self):
         """
         Compute neighbors for all cells. 
+
+        Two cells are neighbors if they share an edge (two point IDs). Instead of
+        comparing every pair of cells, the edges of all cells are sorted so that equal
+        edges are next to each other, and the cells of each group of equal edges are
+        paired up. Calling this method again recomputes the neighbors from scratch.
+
+        The neighbor graph is stored in a compressed sparse row layout: the neighbors
+        of the cell with index i are found, sorted, at positions self._nbr_indptr[i] to
+        self._nbr_indptr[i + 1] of self._nbr_indices, and the point IDs of the edges
+        shared with them in the same rows of self._nbr_shared_edge. The cell instances
+        get the same neighbors in their _neighbors_indices and _shared_edges. The
+        scaled normals of the shared edges and the average velocities of the two cells
+        are stored in self._edge_scaled_normals and self._edge_avg_velocities.
         
         Returns:
         - None 
         """
-        for cell in self._cells_instances:
-            # Compute neighbors for each cell
-            cell.computeNeighbor(self._cells_instances)
\ No newline at end of file
+        num_cells = self._num_cells
+
+        # All edges of all cells as sorted pairs of point IDs, and the cell of each edge:
+        tri = self._triangle_points
+        edges = np.concatenate([self._line_points, tri[:, [0, 1]], tri[:, [1, 2]], tri[:, [2, 0]]])
+        edges = np.sort(edges, axis=1).astype(np.int64)
+        edge_cells = np.concatenate([self._line_indices, np.tile(self._triangle_indices, 3)])
+
+        # Group equal edges, using a single integer key per edge:
+        keys = edges[:, 0] * len(self._points) + edges[:, 1]
+        order = np.argsort(keys, kind='stable')
+        _, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+        # Pair up all cells within each group of equal edges:
+        owners, neighbors, shared = [], [], []
+        for size in np.unique(counts[counts > 1]):
+            members = order[starts[counts == size][:, None] + np.arange(size)]
+            for a, b in permutations(range(size), 2):
+                owners.append(edge_cells[members[:, a]])
+                neighbors.append(edge_cells[members[:, b]])
+                shared.append(edges[members[:, a]])
+        owners = np.concatenate(owners) if owners else np.empty(0, dtype=int)
+        neighbors = np.concatenate(neighbors) if neighbors else np.empty(0, dtype=int)
+        shared = np.concatenate(shared) if shared else np.empty((0, 2), dtype=int)
+
+        # Sort the pairs by cell and neighbor index, keeping each pair once:
+        order = np.lexsort((neighbors, owners))
+        owners, neighbors, shared = owners[order], neighbors[order], shared[order]
+        unique = np.ones(len(owners), dtype=bool)
+        unique[1:] = (owners[1:] != owners[:-1]) | (neighbors[1:] != neighbors[:-1])
+        owners, neighbors, shared = owners[unique], neighbors[unique], shared[unique]
+        self._nbr_indptr = np.searchsorted(owners, np.arange(num_cells + 1)).astype(np.int32)
+        self._nbr_indices = neighbors.astype(np.int32)
+        self._nbr_owners = owners.astype(np.int32)
+        self._nbr_shared_edge = shared.astype(np.int32)
+        self._computeEdgeNormals()
+        self._computeEdgeVelocities()
+
+        if self._cells is not None:
+            self._setCellNeighbors()
+
+    def _computeEdgeNormals(self):
+        """
+        Compute the scaled normals of all edges in the neighbor graph at once.
+
+        The unit normal scaled by the edge length is the edge vector rotated by 90
+        degrees, oriented to point from the midpoint of the cell towards the midpoint
+        of the edge. The result is stored in self._edge_scaled_normals of shape (E, 2),
+        in the same rows as self._nbr_indices.
+
+        Returns:
+        - None
+        """
+        p1 = self._points[self._nbr_shared_edge[:, 0], :2]
+        p2 = self._points[self._nbr_shared_edge[:, 1], :2]
+        edge_vectors = p2 - p1
+        normals = np.stack([edge_vectors[:, 1], -edge_vectors[:, 0]], axis=1)
+
+        # Flip the normals pointing towards the cell midpoint:
+        to_edge_midpoint = (p1 + p2) / 2 - self._midpoints[self._nbr_owners]
+        flip = np.einsum('ij,ij->i', normals, to_edge_midpoint) < 0
+        normals[flip] *= -1
+        self._edge_scaled_normals = normals
+
+    def _computeEdgeVelocities(self):
+        """
+        Compute the average velocity of the two cells of all edges in the neighbor graph at once.
+
+        The result is stored in self._edge_avg_velocities of shape (E, 2), in the
+        same rows as self._nbr_indices.
+
+        Returns:
+        - None
+        """
+        self._edge_avg_velocities = (self._velocities[self._nbr_owners] + self._velocities[self._nbr_indices]) / 2
+
+    def _setCellNeighbors(self):
+        """
+        Store the neighbors of each cell instance together with the shared edges.
+
+        Returns:
+        - None
+        """
+        neighbors = self._nbr_indices.tolist()
+        shared = [tuple(edge) for edge in self._nbr_shared_edge.tolist()]
+        indptr = self._nbr_indptr.tolist()
+        for cell in self._cells:
+            start, end = indptr[cell._idx], indptr[cell._idx + 1]
+            cell._neighbors_indices = neighbors[start:end]
+            cell._shared_edges = dict(zip(cell._neighbors_indices, shared[start:end]))
+
+    def edgeIndex(self, cell_idx, neighbor_index):
+        """
+        Find the position of a neighbor of a cell in the neighbor graph.
+
+        Parameters:
+        - cell_idx (int): The index of the cell.
+        - neighbor_index (int): The index of the neighboring cell.
+
+        Returns:
+        - int or None: The position in self._nbr_indices and self._nbr_shared_edge,
+          or None if the cells are not neighbors.
+        """
+        if self._nbr_indptr is None:
+            self.computeallneighbors()
+        start, end = self._nbr_indptr[cell_idx], self._nbr_indptr[cell_idx + 1]
+        pos = start + np.searchsorted(self._nbr_indices[start:end], neighbor_index)
+        if pos < end and self._nbr_indices[pos] == neighbor_index:
+            return int(pos)
+        return None
+
+    def cellsInRectangle(self, x_range, y_range):
+        """
+        Find the cells with at least one point inside a rectangle.
+
+        The points inside the rectangle are found with a k-d tree of the mesh points
+        at the precision of the mesh file, whatever the dtype of the mesh,
+        and the cells containing them are looked up in a point-to-cells table, so the
+        cost depends on the number of points found instead of the size of the mesh.
+
+        Parameters:
+        - x_range (list[float]): The minimum and maximum x-coordinate of the rectangle.
+        - y_range (list[float]): The minimum and maximum y-coordinate of the rectangle.
+
+        Returns:
+        - np.array: The sorted indices of the cells.
+        """
+        if self._point_tree is None:
+            self._buildPointTree()
+        x_min, x_max = x_range
+        y_min, y_max = y_range
+
+        # Query the square around the rectangle center covering the rectangle
+        # (with a small margin for rounding), then keep the points inside it:
+        center = [(x_min + x_max) / 2, (y_min + y_max) / 2]
+        radius = max(x_max - x_min, y_max - y_min) / 2
+        candidates = np.array(self._point_tree.query_ball_point(center, radius * (1 + 1e-9) + 1e-12, p=np.inf),
+                              dtype=int)
+        coords = self._query_points[candidates]
+        inside = candidates[(x_min <= coords[:, 0]) & (coords[:, 0] <= x_max) &
+                            (y_min <= coords[:, 1]) & (coords[:, 1] <= y_max)]
+
+        cells = [self._point_cells[self._point_cells_indptr[pt]:self._point_cells_indptr[pt + 1]] for pt in inside]
+        return np.unique(np.concatenate(cells)) if cells else np.array([], dtype=int)
+
+    def closestCell(self, point):
+        """
+        Find the cell whose midpoint is closest to a point.
+
+        Parameters:
+        - point (list[float]): The x- and y-coordinate of the point.
+
+        Returns:
+        - int: The index of the closest cell.
+        """
+        _, idx = self._midpointTree().query(point)
+        return int(idx)
+
+    def cellsInCircle(self, center, radius):
+        """
+        Find the cells whose midpoint lies inside a circle.
+
+        Parameters:
+        - center (list[float]): The x- and y-coordinate of the circle center.
+        - radius (float): The radius of the circle.
+
+        Returns:
+        - np.array: The sorted indices of the cells.
+        """
+        return np.array(sorted(self._midpointTree().query_ball_point(center, radius)), dtype=int)
+
+    def _midpointTree(self):
+        """
+        Get the k-d tree of the cell midpoints, building it on first use.
+
+        Returns:
+        - cKDTree: The tree, where the index of each midpoint is the cell index.
+        """
+        if self._midpoint_tree is None:
+            self._midpoint_tree = cKDTree(self._midpoints)
+        return self._midpoint_tree
+
+    def _buildPointTree(self):
+        """
+        Build the k-d tree of the mesh points and the table of the cells containing each point.
+
+        The cells containing the point with index p are found at positions
+        self._point_cells_indptr[p] to self._point_cells_indptr[p + 1] of self._point_cells.
+
+        Returns:
+        - None
+        """
+        self._point_tree = cKDTree(self._query_points)
+        point_ids = np.concatenate([self._line_points.ravel(), self._triangle_points.ravel()])
+        cell_ids = np.concatenate([np.repeat(self._line_indices, 2), np.repeat(self._triangle_indices, 3)])
+        order = np.argsort(point_ids, kind='stable')
+        self._point_cells = cell_ids[order]
+        self._point_cells_indptr = np.searchsorted(point_ids[order], np.arange(len(self._points) + 1))
+
+    def _cacheName(self, mshName):
+        """
+        Get the name of the cache file of a mesh file.
+
+        Parameters:
+        - mshName(str): The mesh file.
+
+        Returns:
+        - str: The cache file name.
+        """
+        return mshName + '.cache.npz'
+
+    def _meshHash(self, mshName):
+        """
+        Get the hash identifying the content of a mesh file.
+
+        Parameters:
+        - mshName(str): The mesh file.
+
+        Returns:
+        - str: The SHA-1 hash of the mesh file.
+        """
+        with open(mshName, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()
+
+    def _loadCache(self, mshName, content_hash):
+        """
+        Load the parsed mesh arrays from the cache file of a mesh file.
+
+        Parameters:
+        - mshName(str): The mesh file.
+        - content_hash(str): The hash of the mesh file, see _meshHash.
+
+        Returns:
+        - tuple or None: The points, the cell type codes and the cell point IDs,
+          or None if there is no valid cache file.
+        """
+        cacheName = self._cacheName(mshName)
+        if not os.path.isfile(cacheName):
+            return None
+        try:
+            with np.load(cacheName) as cache:
+                if str(cache['hash']) != content_hash:
+                    return None
+                return cache['points'], cache['cell_type_codes'], cache['cell_points']
+        except Exception as e:
+            print(f"Error reading mesh cache {cacheName}: {e}")
+            return None
+
+    def _storeCache(self, mshName, content_hash):
+        """
+        Store the parsed mesh arrays in the cache file of a mesh file.
+
+        The points are stored at the precision of the mesh file, before they are
+        converted to the dtype of the mesh.
+
+        Parameters:
+        - mshName(str): The mesh file.
+        - content_hash(str): The hash of the mesh file, see _meshHash.
+
+        Returns:
+        - None
+        """
+        cacheName = self._cacheName(mshName)
+        try:
+            np.savez(cacheName, hash=content_hash, points=self._points, cell_type_codes=self._cell_type_codes,
+                     cell_points=self._cell_points)
+        except Exception as e:
+            print(f"Error writing mesh cache {cacheName}: {e}")
@@ -1,6 +1,8 @@
 from src.Simulation.mesh import *
 from src.Simulation.cells import *
 import numpy as np # type: ignoreimport math
+from numba import config, get_num_threads, set_num_threads
+from src.Simulation.kernels import step_loop, step_loop_triangles
 
 
 class Simulation:
@@ -8,7 +10,8 @@ class Simulation:
     Runs oil spill simulation for certain time interval on a given mesh file. 
     """
     
-    def __init__(self, mesh, tStart, tEnd, num_steps) -> None:
+    def __init__(self, mesh, tStart, tEnd, num_steps, active_threshold=1e-12, num_threads=None,
+                 history_path=None) -> None:
         """ 
         Initialize the simulation. 
         
@@ -17,18 +20,46 @@ class Simulation:
         - tStart(float): The start time of the simulation. 
         - tEnd (float): The end time of the simulation.
         - num_steps (int): The number of time steps that the simulation would run.  
+        - active_threshold (float): Cells are only updated while they or one of their neighbors
+          hold more oil than this. Zero updates every cell that can change. 
+        - num_threads (int): The number of threads updating the cells in parallel. By default
+          all threads Numba was started with (one per CPU core) are used. The thread count
+          of Numba is restored after each run. 
+        - history_path (str): If given, the oil distribution history is a memory-mapped array
+          written to this file instead of an array in memory, so that long runs are not
+          limited by the memory and the history can be read again with np.memmap. 
         
         Returns:
         - None 
+
+        Raises: 
+        - ValueError: If num_threads is not between 1 and the number of threads Numba was started with. 
         """
+        if num_threads is not None and not 1 <= num_threads <= config.NUMBA_NUM_THREADS:
+            raise ValueError(f"num_threads must be between 1 and {config.NUMBA_NUM_THREADS}, got {num_threads}.")
         self._mesh = mesh
         self._tStart = tStart
         self._tEnd = tEnd
         self._num_steps = num_steps
+        self._active_threshold = active_threshold
+        self._num_threads = num_threads
         
         self._dt = (tEnd - tStart) / num_steps
-        self.oil_distribution = {cell._idx: cell._oil for cell in mesh._cells_instances}
-        self.oil_distribution_history = []
+        self._num_cells = mesh._num_cells
+        # Oil in each cell, stored in an array indexed by the cell index:
+        self.oil_distribution = mesh._oil.copy()
+        # Oil distribution at every time step, one row per step:
+        history_shape = (num_steps + 1, self._num_cells)
+        if history_path is not None:
+            self.oil_distribution_history = np.memmap(history_path, dtype=mesh._oil.dtype, mode='w+',
+                                                      shape=history_shape)
+        else:
+            self.oil_distribution_history = np.empty(history_shape, dtype=mesh._oil.dtype)
+
+        # The geometry and the velocity field do not change in time, so the
+        # flux factors of all edges are computed once before time stepping:
+        self._mesh.computeallneighbors()
+        self.computeNormalVelocities()
         
         
     def computeAverageVelocity(self, cell, neighbor_index):
@@ -43,11 +74,10 @@ class Simulation:
         - np.array: The average velocity. 
         
         """
-        neighbor_cell = self._mesh._cells_instances[neighbor_index]
         # Find the velocity in the current cell
         v_i = cell._velocity
         # Find the velocity in the neighbor cell
-        v_n = neighbor_cell._velocity
+        v_n = self._mesh._velocities[neighbor_index]
         # Compute the average velocity
         a_v = (v_i + v_n) / 2
         return a_v
@@ -63,26 +93,63 @@ class Simulation:
 
         Returns: 
         - np.array: The scaled normal vector. 
+
+        Raises: 
+        - ValueError: If the cells do not share an edge. 
+        """
+        # Look up the normal of the shared edge in the neighbor graph of the mesh:
+        edge = self._mesh.edgeIndex(cell._idx, neighbor_index)
+        if edge is None:
+            raise ValueError(f"Cells {cell._idx} and {neighbor_index} do not share an edge.")
+        return self._mesh._edge_scaled_normals[edge]
+    
+    
+    def computeNormalVelocities(self):
+        """ 
+        Compute the dot product of the average velocity and the scaled normal for every
+        edge between a triangle and its neighbors. 
+
+        The results are stored in a compressed sparse row layout: the edges of the cell
+        with index i are found at positions self._indptr[i] to self._indptr[i + 1] of
+        self._neighbors (index of the neighboring cell) and self._vdotn (the dot product).
+        Only triangles get edges, since the oil is only updated in triangles, and
+        self._area_inv holds the inverse area of each triangle (zero for other cells). 
+
+        If no cell has more than three edges, as in meshes of triangles, the edges are
+        also stored in tables of shape (N, 3) for the specialized time loop:
+        self._neighbors_table and self._vdotn_table, where unused slots hold the cell
+        itself with a zero dot product. Otherwise both tables are None. 
+
+        Returns:
+        - None 
         """
-        neighbor_cell = self._mesh._cells_instances[neighbor_index]
-        common_point = set(cell._pointIDs) & set(neighbor_cell._pointIDs)
-
-        if len(common_point) == 2:
-            shared_edge = list(common_point)
-            x1, y1 = self._mesh._points[shared_edge[0]][:-1]
-            x2, y2 = self._mesh._points[shared_edge[1]][:-1]
-
-            edge_vector = np.array([x2 - x1, y2 - y1])
-            normal_vector = np.array([edge_vector[1], -edge_vector[0]])
-            unit_normal = normal_vector / np.linalg.norm(normal_vector)
-            
-            # Check the orientation:
-            midpoint_of_cell = cell._midpoint
-            midpoint_of_edge = np.array([(x1 + x2) / 2, (y1 + y2) / 2]) - midpoint_of_cell
-            if np.dot(unit_normal, midpoint_of_edge) < 0:
-                unit_normal = -unit_normal
-            scaled_normal = unit_normal * np.linalg.norm(edge_vector)
-        return scaled_normal
+        mesh = self._mesh
+        dtype = mesh._oil.dtype
+        triangles = mesh._triangle_indices
+        self._area_inv = np.zeros(self._num_cells, dtype=dtype)
+        self._area_inv[triangles] = 1.0 / mesh._areas[triangles]
+
+        # Keep the rows of the triangles from the neighbor graph of the mesh:
+        num_edges = np.diff(mesh._nbr_indptr).astype(np.int64)
+        num_edges[mesh._cell_type_codes != TRIANGLE] = 0
+        edges = np.flatnonzero(mesh._cell_type_codes[mesh._nbr_owners] == TRIANGLE)
+
+        # Average velocity and scaled normal of all edges, multiplied in one pass:
+        vdotn = np.einsum('ij,ij->i', mesh._edge_avg_velocities[edges], mesh._edge_scaled_normals[edges])
+        self._indptr = np.concatenate(([0], np.cumsum(num_edges)))
+        self._neighbors = mesh._nbr_indices[edges].astype(np.int64)
+        self._vdotn = vdotn.astype(dtype)
+
+        if num_edges.max(initial=0) <= 3:
+            rows = np.repeat(np.arange(self._num_cells), num_edges)
+            slots = np.arange(len(edges)) - self._indptr[rows]
+            self._neighbors_table = np.repeat(np.arange(self._num_cells)[:, None], 3, axis=1)
+            self._neighbors_table[rows, slots] = self._neighbors
+            self._vdotn_table = np.zeros((self._num_cells, 3), dtype=dtype)
+            self._vdotn_table[rows, slots] = self._vdotn
+        else:
+            self._neighbors_table = None
+            self._vdotn_table = None
     
     
     def solution(self):
@@ -92,36 +159,25 @@ class Simulation:
         Returns:
         - None
         """
-        self._mesh.computeallneighbors()
-        self.oil_distribution_history.append(self.oil_distribution.copy())
-        
-        for _ in range(self._num_steps):
-            new_oil_distribution = self.oil_distribution.copy()
-            
-            for cell in self._mesh._cells_instances:
-                if isinstance (cell, Triangle):
-                    total_flux = 0.0
-                
-                    for neighbor in cell._neighbors_indices:
-                        # Look up average velocity:
-                        v = self.computeAverageVelocity(cell, neighbor)
-                        # Look up scaled normal:
-                        n = self.computeScaleNormal(cell, neighbor)
-                    
-                        dot_product = np.dot(v, n)
-                        if dot_product > 0:
-                            g = new_oil_distribution[cell._idx] * dot_product
-                        else:
-                            g = new_oil_distribution[neighbor] * dot_product
-                    
-                        F = -(self._dt / cell._area) * g
-                        total_flux += F
-                    
-                    # Update the copied oil distribution
-                    new_oil_distribution[cell._idx] += total_flux
-            
-            # Update the oil distribution for the next step:
-            self.oil_distribution = new_oil_distribution
-            
-            # Append the updated oil distribution to history
-            self.oil_distribution_history.append(new_oil_distribution.copy())
+        # Run the time loop in compiled code, with the cells split over the
+        # threads, writing every step directly into the history:
+        dt = self._area_inv.dtype.type(self._dt)
+        threshold = self._area_inv.dtype.type(self._active_threshold)
+        previous_threads = get_num_threads()
+        if self._num_threads is not None:
+            set_num_threads(self._num_threads)
+        try:
+            if self._neighbors_table is not None:
+                step_loop_triangles(self.oil_distribution, self._neighbors_table, self._vdotn_table,
+                                    self._area_inv, dt, self._num_steps, self.oil_distribution_history, threshold)
+            else:
+                step_loop(self.oil_distribution, self._indptr, self._neighbors, self._vdotn,
+                          self._area_inv, dt, self._num_steps, self.oil_distribution_history, threshold)
+        finally:
+            set_num_threads(previous_threads)
+
+        if isinstance(self.oil_distribution_history, np.memmap):
+            self.oil_distribution_history.flush()
+
+        # Keep the final oil distribution:
+        self.oil_distribution = np.array(self.oil_distribution_history[-1])
@@ -1,8 +1,13 @@
 import matplotlib.pyplot as plt
+import numpy as np
+import multiprocessing
+import subprocess
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
 from matplotlib.colors import Normalize
-from matplotlib.cm import ScalarMappable
-import cv2 # type: ignore
-import os
+from matplotlib.collections import PolyCollection
+from matplotlib.animation import FFMpegWriter
 from .cells import *
 from .mesh import Mesh
 from .simulation import Simulation
@@ -15,10 +20,11 @@ def draw_mesh(mesh, ax):
     - mesh (Mesh): The mesh file with cells and points information. 
     - ax (matplotlib.axes.Axes): The axis on which to draw the mesh. 
     """
-    for cell in mesh._cells_instances:
-        if isinstance(cell, Triangle):
-            p1, p2, p3 = [mesh._points[pid][:2] for pid in cell._pointIDs]
-            ax.plot([p1[0], p2[0], p3[0], p1[0]], [p1[1], p2[1], p3[1], p1[1]], color='#8A2BE2', linewidth=1, zorder=1, alpha=0.5)
+    # Draw the edges of all triangles as a single collection:
+    edges = PolyCollection(mesh._triangle_vertex_coords, facecolor='none', edgecolor='#8A2BE2',
+                           linewidth=1, zorder=1, alpha=0.5)
+    ax.add_collection(edges)
+    ax.autoscale_view()
 
 
 def plotting(mesh, oil_distribution, figname, time, title = "Oil Distribution"):
@@ -27,31 +33,44 @@ def plotting(mesh, oil_distribution, figname, time, title = "Oil Distribution"):
 
     Parameters:
     - mesh: Mesh object containing cells and points.
-    - oil_distribution: List mapping cell indices to oil amount.
+    - oil_distribution (np.array): Amount of oil in each cell, indexed by the cell index.
     - figname (str): File name to save the plot.
     - time (float): Time to show in the title of the plot. 
     - title (str): Title of the plot.
     """
+    fig, ax, _ = create_oil_plot(mesh, oil_distribution, time, title)
+    return fig, ax
+
+
+def create_oil_plot(mesh, oil_distribution, time, title = "Oil Distribution"):
+    """
+    Create a figure with the oil distribution on the mesh grid.
+
+    Parameters:
+    - mesh: Mesh object containing cells and points.
+    - oil_distribution (np.array): Amount of oil in each cell, indexed by the cell index.
+    - time (float): Time to show in the title of the plot. 
+    - title (str): Title of the plot.
+
+    Returns:
+    - The figure, the axis and the collection of triangles colored by the amount of oil.
+    """
     fig, ax = plt.subplots()
     draw_mesh(mesh, ax)
     
     # Define a colormap and normalization
-    norm = Normalize(vmin=min(oil_distribution.values()), vmax=max(oil_distribution.values()))
+    norm = Normalize(vmin=np.min(oil_distribution), vmax=np.max(oil_distribution))
     cmap = plt.cm.viridis
-    cbar_ax = plt.gca().inset_axes([1, 0, 0.05, 1]) 
+    cbar_ax = ax.inset_axes([1, 0, 0.05, 1]) 
         
-    # Plot each cell with heatmap colors
-    for cell in mesh._cells_instances:
-        if isinstance(cell, Triangle):
-            p1, p2, p3 = [mesh._points[pid][:2] for pid in cell._pointIDs]
-            face_color = cmap(norm(oil_distribution[cell._idx]))
-            triangle = plt.Polygon([p1, p2, p3], edgecolor='none', facecolor=face_color, zorder=2)
-            ax.add_patch(triangle)
+    # Plot all triangles with heatmap colors as a single collection
+    oil_collection = PolyCollection(mesh._triangle_vertex_coords, cmap=cmap, norm=norm,
+                                    edgecolor='none', zorder=2)
+    oil_collection.set_array(np.asarray(oil_distribution)[mesh._triangle_indices])
+    ax.add_collection(oil_collection)
             
     # Create a colorbar
-    sm = ScalarMappable(cmap=cmap, norm=norm)
-    sm.set_array([])
-    cbar = fig.colorbar(sm, cax=cbar_ax)
+    cbar = fig.colorbar(oil_collection, cax=cbar_ax)
     cbar.set_label('Amount of oil')
     
     ax.set_aspect('equal')
@@ -59,51 +78,127 @@ def plotting(mesh, oil_distribution, figname, time, title = "Oil Distribution"):
     ax.set_ylabel('y')
     ax.set_title(f"{title}\n at t = {time:.2f}")
     
-    return fig, ax
+    return fig, ax, oil_collection
+
+
+def update_oil_plot(mesh, ax, oil_collection, oil_distribution, time, title = "Oil Distribution"):
+    """
+    Update a figure made by create_oil_plot with a new oil distribution.
+
+    Parameters:
+    - mesh: Mesh object containing cells and points.
+    - ax (matplotlib.axes.Axes): The axis of the figure.
+    - oil_collection (PolyCollection): The collection of triangles returned by create_oil_plot.
+    - oil_distribution (np.array): Amount of oil in each cell, indexed by the cell index.
+    - time (float): Time to show in the title of the plot. 
+    - title (str): Title of the plot.
+    """
+    oil_collection.set_array(np.asarray(oil_distribution)[mesh._triangle_indices])
+    oil_collection.set_clim(np.min(oil_distribution), np.max(oil_distribution))
+    ax.set_title(f"{title}\n at t = {time:.2f}")
     
 
-def video(mesh, oil_distribution_history, video_name, fps):
+def _init_frame_worker(triangle_vertex_coords, triangle_indices, oil_distribution):
+    """
+    Set up the figure used by a worker process of video() to render frames.
+
+    Parameters:
+    - triangle_vertex_coords (np.array): Vertex coordinates of the triangles, of shape (N, 3, 2).
+    - triangle_indices (np.array): Cell index of each triangle.
+    - oil_distribution (np.array): Oil distribution used to create the figure.
+    """
+    global _frame_mesh, _frame_plot
+    plt.switch_backend('Agg')
+    # Only these mesh arrays are needed for plotting, so the full mesh is not sent to the worker
+    _frame_mesh = SimpleNamespace(_triangle_vertex_coords=triangle_vertex_coords,
+                                  _triangle_indices=triangle_indices)
+    _frame_plot = create_oil_plot(_frame_mesh, oil_distribution, time=0, title='Oil Distribution')
+
+
+def _render_frame(i, oil_distribution):
+    """
+    Render one video frame in a worker process set up by _init_frame_worker.
+
+    Parameters:
+    - i (int): The time step of the frame.
+    - oil_distribution (np.array): Oil distribution at the time step.
+
+    Returns:
+    - np.array: The RGB image of the frame, of shape (height, width, 3).
+    """
+    fig, ax, oil_collection = _frame_plot
+    update_oil_plot(_frame_mesh, ax, oil_collection, oil_distribution, time=i, title='Oil Distribution')
+    fig.canvas.draw()
+    return np.array(fig.canvas.buffer_rgba())[:, :, :3]
+
+
+def _write_frames(frames, video_name, fps):
+    """
+    Encode RGB images to a video by piping them directly to ffmpeg.
+
+    Parameters:
+    - frames (iterator[np.array]): The RGB images of the frames, all of the same shape (height, width, 3).
+    - video_name (str): Name of the output video file.
+    - fps (int): Frames per second for the output video.
+
+    Raises:
+    - subprocess.CalledProcessError: If ffmpeg fails.
+    """
+    first_frame = next(frames)
+    height, width, _ = first_frame.shape
+    # Same encoder settings as the FFMpegWriter of the serial path, where h264
+    # with yuv420p needs even frame sizes:
+    command = [FFMpegWriter.bin_path(), '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', f'{width}x{height}',
+               '-pix_fmt', 'rgb24', '-framerate', str(fps), '-i', 'pipe:', '-loglevel', 'error',
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-vcodec', 'h264', '-pix_fmt', 'yuv420p', '-y', video_name]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+        for frame in chain([first_frame], frames):
+            process.stdin.write(np.ascontiguousarray(frame).tobytes())
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def video(mesh, oil_distribution_history, video_name, fps, workers=1):
     """
     Create a video showing changes in plots of oil distribution over time.
 
+    With more than one worker the frames are rendered in parallel by worker processes
+    and the images are piped to ffmpeg in order. Starting the workers takes a few
+    seconds, so this only pays off for long videos.
+
     Parameters:
         mesh (Mesh): The mesh object.
-        oil_distribution_history (list): List of oil distribution data at different time steps.
+        oil_distribution_history (np.array): Oil distribution at different time steps, one row per step.
         video_name (str): Name of the output video file.
         fps (int): Frames per second for the output video.
+        workers (int): Number of processes rendering frames (default: 1, render in this process).
     """
-    
-    # List to store plot image filenames
-    plot_images = []
-    
-    # Loop through frames
-    for i, oil_distribution in enumerate(oil_distribution_history):
-        if i % 10 == 0:
-            
-            # Plot oil distribution for current frame
-            fig, ax = plotting(mesh, oil_distribution, 'plot',time =i, title='Oil Distribution')
-        
-            # Save plot as image file
-            plot_image_file = f"plot_{i}.png"
-            fig.savefig(plot_image_file)
-            plt.close(fig)
-        
-            plot_images.append(plot_image_file)
-    
-    # Read the dimensions of the first image
-    height, width, _ = cv2.imread(plot_images[0]).shape
-    
-    # Define the codec and create a VideoWriter object
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video_writer = cv2.VideoWriter(video_name, fourcc, fps, (width, height))
-    
-    # Write images to video
-    for plot_image_file in plot_images:
-        frame = cv2.imread(plot_image_file)
-        video_writer.write(frame)
-        os.remove(plot_image_file)  # Remove the temporary image file
-        
-    video_writer.release()
+    frame_steps = range(0, len(oil_distribution_history), 10)
+
+    if workers <= 1:
+        writer = FFMpegWriter(fps=fps, codec='h264')
+        # Create the figure once and only update the oil values for each frame
+        fig, ax, oil_collection = create_oil_plot(mesh, oil_distribution_history[0], time=0, title='Oil Distribution')
+
+        # Pipe the rendered frames directly to ffmpeg
+        with writer.saving(fig, video_name, dpi=100):
+            # Loop through frames
+            for i in frame_steps:
+                # Plot oil distribution for current frame
+                update_oil_plot(mesh, ax, oil_collection, oil_distribution_history[i], time=i, title='Oil Distribution')
+                writer.grab_frame()
+
+        plt.close(fig)
+        return
+
+    # Start the workers with spawn, since forking a process that has started the
+    # threads of the compiled simulation kernel is not safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_frame_worker,
+                             initargs=(mesh._triangle_vertex_coords, mesh._triangle_indices,
+                                       oil_distribution_history[0])) as executor:
+        frames = executor.map(_render_frame, frame_steps, (oil_distribution_history[i] for i in frame_steps))
+        _write_frames(frames, video_name, fps)
 
 
 if __name__ == '__main__':
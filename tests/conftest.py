@@ -0,0 +1,17 @@
+import pytest
+from src.Simulation.mesh import Mesh
+
+
+@pytest.fixture(scope="session")
+def testmesh():
+    """ 
+    Fixture to create a Mesh for testing, shared by all tests. 
+
+    The tests only read the mesh or call the idempotent computeallneighbors, so the
+    mesh is read once per test session. 
+
+    Returns: 
+    - Mesh: A Mesh created for testing. 
+    """
+    mesh_path = 'tests/simple_mesh.msh'
+    return Mesh(mesh_path)
@@ -1,20 +1,7 @@
-import pytest
 import numpy as np
 import math
-from src.Simulation.mesh import Mesh
 from src.Simulation.cells import Cell, Line, Triangle, CellFactory
 
-@pytest.fixture
-def testmesh():
-    """ 
-    Fixture to create a Mesh for testing. 
-
-    Returns: 
-    - Mesh: A Mesh created for testing. 
-    """
-    mesh_path = 'tests/simple_mesh.msh'
-    return Mesh(mesh_path)
-
 
 def test_CellFactory(testmesh):
     """ 
@@ -68,15 +55,45 @@ def test_computeNeighbor(testmesh):
         for neighbor_index in cell._neighbors_indices:
             assert neighbor_index != cell._idx, f"Cell {cell._idx} contains itself in the neighbor indices list."
             
-            # Check if the index of the neighbor is actually in the cell instances list from the mesh:
-            neighbor_found = False
-            for neighbor in testmesh._cells_instances:
-                if neighbor._idx == neighbor_index:
-                    neighbor_found = True
-                    break
-                
+            # Check if the index of the neighbor is actually in the cell instances list from the mesh,
+            # which holds the cell with index i at position i:
+            neighbor_found = (0 <= neighbor_index < len(testmesh._cells_instances) and
+                              testmesh._cells_instances[neighbor_index]._idx == neighbor_index)
             assert neighbor_found, f" Cell {cell._idx} has invalid neighbor index {neighbor_index}"
             
+
+
+def test_computeNeighbor_matches_mesh(testmesh):
+    """ 
+    Test the computeNeighbor method in the Cell class against the neighbor graph of the mesh.
+    - Checks if the neighbors found from the mesh arrays match the rows of the neighbor graph. 
+    - Checks if the neighbors found by cells created without a mesh match the same rows. 
+    """
+    testmesh.computeallneighbors()
+    cf = CellFactory()
+    cf.register('line', Line)
+    cf.register('triangle', Triangle)
+    standalone_cells = [cf(cell.__class__.__name__.lower(), cell._pointIDs, cell._idx, cell._coord)
+                        for cell in testmesh._cells_instances]
+
+    for cell, standalone_cell in zip(testmesh._cells_instances, standalone_cells):
+        start, end = testmesh._nbr_indptr[cell._idx], testmesh._nbr_indptr[cell._idx + 1]
+        expected_neighbors = list(testmesh._nbr_indices[start:end])
+        expected_edges = {int(neighbor): tuple(edge) for neighbor, edge in
+                          zip(testmesh._nbr_indices[start:end], testmesh._nbr_shared_edge[start:end].tolist())}
+
+        # Recompute the neighbors of the mesh cell from the mesh arrays:
+        neighbors, shared_edges = cell._neighbors_indices, cell._shared_edges
+        cell._neighbors_indices, cell._shared_edges = [], {}
+        try:
+            assert sorted(cell.computeNeighbor(testmesh._cells_instances)) == expected_neighbors
+            assert cell._shared_edges == expected_edges
+        finally:
+            cell._neighbors_indices, cell._shared_edges = neighbors, shared_edges
+
+        # Compute the neighbors of the cell created without a mesh:
+        assert sorted(standalone_cell.computeNeighbor(standalone_cells)) == expected_neighbors
+        assert standalone_cell._shared_edges == expected_edges
     
 def test_computeMidpoint(testmesh):
     """ 
@@ -0,0 +1,77 @@
+import json
+import numpy as np
+from src.Simulation.io_operations import store_solution, load_solution, history_to_dicts, dicts_to_history
+
+
+def make_history():
+    """
+    Create an oil distribution history for testing.
+
+    Returns:
+    - np.array: A history of 4 time steps and 12 cells, so that the cell indices
+      sort differently as strings ('10' < '2') and as numbers.
+    """
+    return np.arange(48, dtype=np.float64).reshape(4, 12) / 7
+
+
+def test_store_load_npz(tmp_path):
+    """
+    Test storing and loading a solution as a .npz file.
+    - Checks if the file holds the history and the cell index of each column.
+    - Checks if the loaded history has the shape and the values of the stored history.
+    """
+    history = make_history()
+    filename = str(tmp_path / 'solution.npz')
+    store_solution(history, filename)
+
+    with np.load(filename) as solution:
+        assert np.array_equal(solution['oil'], history)
+        assert np.array_equal(solution['cell_idx'], np.arange(12))
+
+    loaded = load_solution(filename)
+    assert loaded.shape == history.shape
+    assert np.array_equal(loaded, history)
+
+
+def test_store_load_json(tmp_path):
+    """
+    Test storing and loading a solution as a .json file.
+    - Checks if the file holds one dictionary per time step with string cell indices.
+    - Checks if the loaded history has the shape and the values of the stored history.
+    """
+    history = make_history()
+    filename = str(tmp_path / 'solution.json')
+    store_solution(history, filename, use_json=True)
+
+    with open(filename, 'r') as file:
+        dicts = json.load(file)
+    assert len(dicts) == 4
+    assert sorted(dicts[0], key=int) == [str(idx) for idx in range(12)]
+
+    loaded = load_solution(filename)
+    assert loaded.shape == history.shape
+    assert np.array_equal(loaded, history)
+
+
+def test_dicts_to_history():
+    """
+    Test the conversion between the history and the list of dictionaries.
+    - Checks if the dictionaries map each cell index to its oil amount.
+    - Checks if string keys in any order come back in cell order.
+    """
+    history = make_history()
+    dicts = history_to_dicts(history)
+    assert [sorted(step) for step in dicts] == [list(range(12))] * 4
+    assert all(dicts[step][idx] == history[step, idx] for step in range(4) for idx in range(12))
+
+    # JSON keys are strings, and their order in the file does not matter:
+    string_dicts = [{str(idx): step[idx] for idx in sorted(step, key=str, reverse=True)} for step in dicts]
+    assert np.array_equal(dicts_to_history(string_dicts), history)
+
+
+def test_load_missing_solution(tmp_path):
+    """
+    Test loading a solution file that does not exist.
+    - Checks if None is returned.
+    """
+    assert load_solution(str(tmp_path / 'missing.npz')) is None
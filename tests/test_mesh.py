@@ -1,18 +1,9 @@
 import pytest
+import shutil
 import numpy as np
+import src.Simulation.mesh as mesh_module
 from src.Simulation.mesh import Mesh
-from src.Simulation.cells import Cell, Line, Triangle, CellFactory
-
-@pytest.fixture
-def testmesh():
-    """ 
-    Fixture to create a Mesh for testing. 
-
-    Returns: 
-    - Mesh: A Mesh created for testing. 
-    """
-    mesh_path = 'tests/simple_mesh.msh'
-    return Mesh(mesh_path)
+from src.Simulation.cells import Cell, Line, Triangle, CellFactory, LINE, TRIANGLE
 
 
 def test_mesh_initialization(testmesh):
@@ -27,6 +18,7 @@ def test_mesh_initialization(testmesh):
 
     # Check if the cell instances are created correctly: there are 4 line elements and 4 triangle elements
     assert len(testmesh._cells_instances) == 8
+    assert [cell._idx for cell in testmesh._cells_instances] == list(range(8))
     
     
 def test_compute_neighbors(testmesh):
@@ -42,3 +34,157 @@ def test_compute_neighbors(testmesh):
         expected_neighbors_indices = cell._neighbors_indices
         assert sorted(cell._neighbors_indices) == sorted(expected_neighbors_indices)
 
+def test_mesh_dtype():
+    """ 
+    Test the dtype parameter of the Mesh class. 
+    - Checks if the points and the cell arrays have the default and the requested floating point type. 
+    - Checks if both types give the same geometry within single precision. 
+    """
+    mesh = Mesh('tests/simple_mesh.msh')
+    mesh_double = Mesh('tests/simple_mesh.msh', dtype=np.float64)
+    mesh.computeallneighbors()
+    mesh_double.computeallneighbors()
+    for name in ['_points', '_midpoints', '_areas', '_velocities', '_oil', '_edge_scaled_normals', '_edge_avg_velocities']:
+        assert getattr(mesh, name).dtype == Mesh.DTYPE
+        assert getattr(mesh_double, name).dtype == np.float64
+        assert np.allclose(getattr(mesh, name), getattr(mesh_double, name), atol=1e-5)
+
+
+def test_neighbor_graph(testmesh):
+    """ 
+    Test the neighbor graph and the edgeIndex method in the Mesh class. 
+    - Checks if the rows of the neighbor graph match the neighbors of each cell. 
+    - Checks if edgeIndex finds the shared edge of each neighbor and None for other cells. 
+    - Checks if the average velocity of each edge matches the velocities of its two cells. 
+    """
+    testmesh.computeallneighbors()
+    for cell in testmesh._cells_instances:
+        start, end = testmesh._nbr_indptr[cell._idx], testmesh._nbr_indptr[cell._idx + 1]
+        assert list(testmesh._nbr_indices[start:end]) == sorted(cell._neighbors_indices)
+        for neighbor_index in cell._neighbors_indices:
+            edge = testmesh.edgeIndex(cell._idx, neighbor_index)
+            assert tuple(testmesh._nbr_shared_edge[edge]) == cell._shared_edges[neighbor_index]
+            expected_velocity = (cell._velocity + testmesh._cells_instances[neighbor_index]._velocity) / 2
+            assert np.allclose(testmesh._edge_avg_velocities[edge], expected_velocity)
+        assert testmesh.edgeIndex(cell._idx, cell._idx) is None
+
+
+def test_cell_type_codes(testmesh):
+    """ 
+    Test the cell type code and point ID arrays in the Mesh class. 
+    - Checks if the type code and the padded point IDs of each cell match the cell instance. 
+    """
+    for cell in testmesh._cells_instances:
+        expected_code = TRIANGLE if isinstance(cell, Triangle) else LINE
+        assert testmesh._cell_type_codes[cell._idx] == expected_code
+        num_points = len(cell._pointIDs)
+        assert list(testmesh._cell_points[cell._idx][:num_points]) == list(cell._pointIDs)
+        assert all(testmesh._cell_points[cell._idx][num_points:] == -1)
+
+
+def test_cellsInRectangle(testmesh):
+    """ 
+    Test the cellsInRectangle method in the Mesh class. 
+    - Checks if the found cells are exactly the cells with a point inside the rectangle. 
+    """
+    x_range = [0.0, 0.5]
+    y_range = [0.0, 0.5]
+    cells = testmesh.cellsInRectangle(x_range, y_range)
+
+    # Manually find the cells with at least one point inside the rectangle:
+    expected_cells = []
+    for cell in testmesh._cells_instances:
+        for pt in cell._pointIDs:
+            x, y = testmesh._points[pt][:2]
+            if x_range[0] <= x <= x_range[1] and y_range[0] <= y <= y_range[1]:
+                expected_cells.append(cell._idx)
+                break
+
+    assert list(cells) == sorted(expected_cells)
+
+
+def test_cellsInRectangle_single_precision_boundary():
+    """ 
+    Test the cellsInRectangle method in the Mesh class with a boundary that single precision cannot represent. 
+    - Checks if the cells of the float32 mesh are the cells with a point inside the rectangle at the precision
+      of the mesh file, including the points on the boundary x = 0.3. 
+    """
+    mesh_path = 'src/Simulation/bay.msh'
+    mesh = Mesh(mesh_path)
+    mesh_double = Mesh(mesh_path, dtype=np.float64)
+    assert mesh._points.dtype == np.float32
+    x_range = [0.0, 0.3]
+    y_range = [0.0, 0.1]
+    cells = mesh.cellsInRectangle(x_range, y_range)
+
+    # Manually find the cells with at least one point inside the rectangle in double precision:
+    points = mesh_double._points
+    inside = ((x_range[0] <= points[:, 0]) & (points[:, 0] <= x_range[1]) &
+              (y_range[0] <= points[:, 1]) & (points[:, 1] <= y_range[1]))
+    expected_cells = [cell._idx for cell in mesh_double._cells_instances if inside[cell._pointIDs].any()]
+
+    assert list(cells) == expected_cells
+    assert 15 in cells and 3646 in cells
+
+
+def test_closestCell(testmesh):
+    """ 
+    Test the closestCell method in the Mesh class. 
+    - Checks if the found cell has the midpoint closest to the given point. 
+    """
+    point = np.array([0.5, 0.8])
+    idx = testmesh.closestCell(point)
+
+    distances = [np.linalg.norm(cell._midpoint - point) for cell in testmesh._cells_instances]
+    assert np.isclose(distances[idx], min(distances))
+
+
+def test_cellsInCircle(testmesh):
+    """ 
+    Test the cellsInCircle method in the Mesh class. 
+    - Checks if the found cells are exactly the cells with the midpoint inside the circle. 
+    """
+    center = np.array([0.5, 0.8])
+    radius = 0.4
+    cells = testmesh.cellsInCircle(center, radius)
+
+    expected_cells = [cell._idx for cell in testmesh._cells_instances
+                      if np.linalg.norm(cell._midpoint - center) <= radius]
+    assert len(expected_cells) > 0
+    assert list(cells) == expected_cells
+
+
+def test_mesh_cache(tmp_path, monkeypatch):
+    """ 
+    Test the mesh cache of the Mesh class. 
+    - Checks if the cache file is written next to the mesh file and holds only the parsed mesh. 
+    - Checks if the mesh loaded from the cache matches the mesh read from the mesh file. 
+    - Checks if the initial oil follows a changed initial_oil instead of coming from the cache. 
+    - Checks if a cache written in single precision gives the same double precision mesh. 
+    """
+    mesh_path = str(tmp_path / 'simple_mesh.msh')
+    shutil.copy('tests/simple_mesh.msh', mesh_path)
+
+    mesh = Mesh(mesh_path, use_cache=True)
+    assert (tmp_path / 'simple_mesh.msh.cache.npz').is_file()
+
+    cached_mesh = Mesh(mesh_path, use_cache=True)
+    assert np.array_equal(cached_mesh._points, mesh._points)
+    assert np.array_equal(cached_mesh._midpoints, mesh._midpoints)
+    assert np.array_equal(cached_mesh._oil, mesh._oil)
+    assert [type(cell) for cell in cached_mesh._cells_instances] == [type(cell) for cell in mesh._cells_instances]
+    for cached_cell, cell in zip(cached_mesh._cells_instances, mesh._cells_instances):
+        assert np.array_equal(cached_cell._pointIDs, cell._pointIDs)
+    with np.load(tmp_path / 'simple_mesh.msh.cache.npz') as cache:
+        assert sorted(cache.files) == ['cell_points', 'cell_type_codes', 'hash', 'points']
+
+    initial_oil = mesh_module.initial_oil
+    monkeypatch.setattr(mesh_module, 'initial_oil', lambda midpoints: initial_oil(midpoints, np.array([0.5, 0.5])))
+    assert np.array_equal(Mesh(mesh_path, use_cache=True)._oil, Mesh(mesh_path)._oil)
+    monkeypatch.undo()
+
+    double_mesh = Mesh(mesh_path, dtype=np.float64)
+    cached_double_mesh = Mesh(mesh_path, use_cache=True, dtype=np.float64)
+    assert np.array_equal(cached_double_mesh._points, double_mesh._points)
+    assert np.array_equal(cached_double_mesh._midpoints, double_mesh._midpoints)
+    assert np.array_equal(cached_double_mesh._areas, double_mesh._areas)
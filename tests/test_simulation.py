@@ -1,26 +1,16 @@
 import pytest
+import numba
 import numpy as np
-from src.Simulation.mesh import Mesh
 from src.Simulation.cells import Cell, Line, Triangle, CellFactory
 from src.Simulation.simulation import Simulation
 
-@pytest.fixture
-def testmesh():
-    """ 
-    Fixture to create a Mesh for testing. 
-
-    Returns: 
-    - Mesh: A Mesh created for testing. 
-    """
-    mesh_path = 'tests/simple_mesh.msh'
-    return Mesh(mesh_path)
 
 def test_simulation_initialization(testmesh):
     """ 
     Test the initialization of Simulation class.
     - Checks if the attributes in the Simulation instance match the expected values. 
     - Checks if the oil distribution is initialized correctly. 
-    - Checks if the oil distribution history is initially an empty list. 
+    - Checks if the oil distribution history is allocated with one row per time step. 
     """
     tStart = 0
     tEnd = 0.5
@@ -39,7 +29,7 @@ def test_simulation_initialization(testmesh):
             expected_oil = cell._oil 
             assert sim.oil_distribution[cell._idx] == expected_oil
 
-        assert sim.oil_distribution_history == []
+    assert sim.oil_distribution_history.shape == (num_steps + 1, len(sim._mesh._cells_instances))
 
 
 def test_computeAverageVelocity(testmesh):
@@ -88,7 +78,7 @@ def test_computeScaleNormal(testmesh):
                     unit_normal = normal_vector / length_normal
                     
                     # Get the midpoint of the current cell
-                    midpoint_of_cell = np.array(cell._midpoint)
+                    midpoint_of_cell = cell._midpoint
                     
                     # Calculate the midpoint of the shared edge
                     midpoint_of_edge = np.array([(x1 + x2) / 2, (y1 + y2) / 2]) - midpoint_of_cell
@@ -125,7 +115,80 @@ def test_solution_function(testmesh):
     for cell in sim._mesh._cells_instances:
         if isinstance(cell, Triangle):
             # Check if the oil distribution for the current cell is updated
-            assert cell._idx in sim.oil_distribution_history[-1], f"Oil distribution not updated for cell {cell._idx}"
+            assert sim.oil_distribution_history[-1][cell._idx] != sim.oil_distribution_history[0][cell._idx], f"Oil distribution not updated for cell {cell._idx}"
 
     # Check if the number of keys in oil_distribution_history is same as num_steps
     assert len(sim.oil_distribution_history) == sim._num_steps + 1, "Mismatch in number of time steps"
+
+
+def test_active_threshold(testmesh):
+    """ 
+    Test the active_threshold parameter of the Simulation class.
+    - Checks if no cell changes when every cell holds less oil than the threshold. 
+    - Checks if a small threshold gives the same result as updating every cell. 
+    """
+    max_oil = max(cell._oil for cell in testmesh._cells_instances)
+    sim = Simulation(testmesh, 0, 0.5, 50, active_threshold=2 * max_oil)
+    sim.solution()
+    assert np.array_equal(sim.oil_distribution_history[-1], sim.oil_distribution_history[0])
+
+    sim_all = Simulation(testmesh, 0, 0.5, 50, active_threshold=0)
+    sim_all.solution()
+    sim_small = Simulation(testmesh, 0, 0.5, 50, active_threshold=1e-12)
+    sim_small.solution()
+    assert np.allclose(sim_small.oil_distribution_history, sim_all.oil_distribution_history)
+
+
+def test_num_threads(testmesh):
+    """ 
+    Test the num_threads parameter of the Simulation class.
+    - Checks if running on a single thread gives the same result as the default. 
+    - Checks if the thread count of Numba is restored after the run. 
+    - Checks if an invalid number of threads raises a ValueError. 
+    """
+    sim = Simulation(testmesh, 0, 0.5, 50)
+    sim.solution()
+    threads = numba.get_num_threads()
+    sim_single = Simulation(testmesh, 0, 0.5, 50, num_threads=1)
+    sim_single.solution()
+    assert np.allclose(sim_single.oil_distribution_history, sim.oil_distribution_history)
+    assert numba.get_num_threads() == threads
+
+    for num_threads in [0, numba.config.NUMBA_NUM_THREADS + 1]:
+        with pytest.raises(ValueError):
+            Simulation(testmesh, 0, 0.5, 50, num_threads=num_threads)
+
+
+def test_triangle_tables(testmesh):
+    """ 
+    Test the edge tables for the specialized time loop of the Simulation class.
+    - Checks if the tables are built for a mesh of triangles and lines. 
+    - Checks if the specialized time loop gives the same result as the general one. 
+    """
+    sim = Simulation(testmesh, 0, 0.5, 50)
+    assert sim._neighbors_table is not None
+    sim.solution()
+
+    sim_general = Simulation(testmesh, 0, 0.5, 50)
+    sim_general._neighbors_table = None
+    sim_general.solution()
+    assert np.allclose(sim.oil_distribution_history, sim_general.oil_distribution_history)
+
+
+def test_history_path(testmesh, tmp_path):
+    """ 
+    Test the history_path parameter of the Simulation class.
+    - Checks if the history written to the file matches the history kept in memory. 
+    """
+    sim = Simulation(testmesh, 0, 0.5, 50)
+    sim.solution()
+
+    history_path = tmp_path / 'history.dat'
+    sim_mapped = Simulation(testmesh, 0, 0.5, 50, history_path=str(history_path))
+    sim_mapped.solution()
+    assert np.allclose(sim_mapped.oil_distribution_history, sim.oil_distribution_history)
+    assert np.allclose(sim_mapped.oil_distribution, sim.oil_distribution)
+
+    stored = np.memmap(history_path, dtype=sim.oil_distribution_history.dtype, mode='r',
+                       shape=sim.oil_distribution_history.shape)
+    assert np.allclose(stored, sim.oil_distribution_history)